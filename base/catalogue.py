@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+File (Python):  'catalogue.py'
+author:         Tanguy Racine
+date:           2025
+
+Catalogue manifest of the karst data repository:
+- passage discovery and point cloud filepath resolution
+- LAS header and scan.yaml metadata, without loading the point clouds
+- bounding-box spatial index and size-aware job scheduling
+"""
+
+import json
+import heapq
+import laspy
+import numpy as np
+
+from os import path, listdir
+from yaml import load
+from yaml.loader import Loader
+
+# point cloud samplings stored in the pointclouds folder of each passage.
+SAMPLINGS = ("2mm", "5cm")
+
+
+def find_cloud_filepath(filepath, sampling: str = "5cm") -> str:
+    """
+    Returns the path to the classified point cloud of a passage, preferring the
+    georeferenced file over the one in local coordinates.
+
+        ----------
+        arguments:
+
+            filepath -> str : the path to a specific cave passage directory.
+            sampling -> str : the point cloud sampling, either "2mm" or "5cm"
+
+        ----------
+
+        returns :
+            str, or None if no point cloud exists.
+    """
+
+    cave, passage = path.normpath(filepath).split(path.sep)[-2:]
+    stub = path.join(filepath, "pointclouds", f"{cave}_{passage}_sampled_{sampling}_PCV_normals_classified")
+
+    for cloud_fp in (f"{stub}_georef.las", f"{stub}.las"):
+        if path.exists(cloud_fp):
+            return cloud_fp
+    return None
+
+
+def list_passages(data_repository) -> list:
+    """Lists the passage directories of the data repository, organised as data/<cave>/<passage>."""
+
+    passages_fp = []
+    for cave in sorted(listdir(data_repository)):
+        cave_fp = path.join(data_repository, cave)
+        if "." in cave or not path.isdir(cave_fp):
+            continue
+        for passage in sorted(listdir(cave_fp)):
+            if "." not in passage and path.isdir(path.join(cave_fp, passage)):
+                passages_fp.append(path.normpath(path.join(cave_fp, passage)))
+    return passages_fp
+
+
+def read_las_header(cloud_fp) -> dict:
+    """
+    Reads the header of a LAS file, leaving the point records untouched.
+
+        ----------
+        arguments:
+
+            cloud_fp -> str : the path to a LAS file.
+
+        ----------
+
+        returns :
+            dict with the point count, bounds ([xmin, ymin, zmin, xmax, ymax, zmax]),
+            scales, offsets, available fields and file modification time.
+    """
+
+    with laspy.open(cloud_fp) as f:
+        header = f.header
+        return dict(filepath=path.normpath(cloud_fp),
+                    mtime=path.getmtime(cloud_fp),
+                    georef=cloud_fp.endswith("_georef.las"),
+                    point_count=int(header.point_count),
+                    bounds=np.concatenate((header.mins, header.maxs)).tolist(),
+                    scales=np.asarray(header.scales).tolist(),
+                    offsets=np.asarray(header.offsets).tolist(),
+                    fields=list(header.point_format.dimension_names))
+
+
+def read_crs(filepath):
+    """Returns the EPSG code stored in the scan.yaml file of a passage, or None."""
+
+    scan_fp = path.join(filepath, "scan.yaml")
+    if not path.exists(scan_fp):
+        return None
+    with open(scan_fp) as f:
+        scan_params = load(f, Loader)
+    try:
+        return scan_params["alignment"]["crs"]
+    except (KeyError, TypeError):
+        return None
+
+
+def _scan_mtime(filepath):
+    scan_fp = path.join(filepath, "scan.yaml")
+    return path.getmtime(scan_fp) if path.exists(scan_fp) else None
+
+
+def _passage_record(filepath) -> dict:
+    """Gathers the metadata of a single passage directory."""
+
+    cave, passage = filepath.split(path.sep)[-2:]
+
+    clouds = {}
+    for sampling in SAMPLINGS:
+        cloud_fp = find_cloud_filepath(filepath, sampling)
+        if cloud_fp is not None:
+            clouds[sampling] = read_las_header(cloud_fp)
+
+    return dict(cave=cave,
+                passage=passage,
+                filepath=filepath,
+                epsg=read_crs(filepath),
+                scan_mtime=_scan_mtime(filepath),
+                clouds=clouds)
+
+
+def _is_current(record: dict) -> bool:
+    """Checks that neither the point clouds nor the scan.yaml of a passage changed since it was recorded."""
+
+    if record.get("scan_mtime") != _scan_mtime(record["filepath"]):
+        return False
+
+    for sampling in SAMPLINGS:
+        cloud_fp = find_cloud_filepath(record["filepath"], sampling)
+        cloud = record["clouds"].get(sampling)
+        if cloud_fp is None or cloud is None:
+            if cloud_fp is not None or cloud is not None:
+                return False
+        elif cloud["filepath"] != path.normpath(cloud_fp) or cloud.get("mtime") != path.getmtime(cloud_fp):
+            return False
+    return True
+
+
+def _relocate(manifest: dict, source: str, target: str) -> dict:
+    """Rewrites the filepaths of a manifest from a source to a target root directory."""
+
+    def move(fp):
+        return path.normpath(path.join(target, path.relpath(fp, source)))
+
+    passages = []
+    for record in manifest["passages"]:
+        clouds = {sampling: {**cloud, "filepath": move(cloud["filepath"])}
+                  for sampling, cloud in record["clouds"].items()}
+        passages.append({**record, "filepath": move(record["filepath"]), "clouds": clouds})
+
+    return dict(passage_directories=[move(fp) for fp in manifest.get("passage_directories", [])],
+                passages=passages)
+
+
+def update_manifest(data_repository, manifest_fp: str = None, previous: dict = None) -> dict:
+    """
+    Scans the data repository and gathers the metadata of every passage from the
+    LAS headers and scan.yaml files. Passages of a previous manifest whose files
+    did not change are kept as they are, so only new or modified passages are read.
+    The manifest is saved as JSON, with filepaths relative to the data repository.
+
+        ----------
+        arguments:
+
+            data_repository -> str : the path to the karst catalogue.
+            manifest_fp -> str : the output filepath, defaults to <data_repository>/manifest.json
+            previous -> dict : a previously loaded manifest, None to read every passage.
+
+        ----------
+
+        returns :
+            dict with a list of passage records, with absolute filepaths.
+    """
+
+    data_repository = path.abspath(data_repository)
+    if manifest_fp is None:
+        manifest_fp = path.join(data_repository, "manifest.json")
+
+    first_build = previous is None
+    if first_build:
+        previous = dict(passage_directories=[], passages=[])
+    known = {record["filepath"]: record for record in previous["passages"]}
+    passage_directories = list_passages(data_repository)
+
+    passages, n_updated = [], 0
+    for fp in passage_directories:
+        record = known.get(fp)
+        if record is None or not _is_current(record):
+            record = _passage_record(fp)
+            n_updated += 1
+        passages.append(record)
+
+    manifest = dict(data_repository=data_repository,
+                    passage_directories=passage_directories,
+                    passages=passages)
+
+    # nothing to write if no passage was added, removed or modified.
+    if not first_build and n_updated == 0 and previous["passage_directories"] == passage_directories:
+        return manifest
+
+    with open(manifest_fp, "w") as f:
+        json.dump(_relocate(manifest, data_repository, "."), f, indent=1)
+
+    print(f"{len(passages)} passages ({n_updated} updated) written to {manifest_fp}")
+    return manifest
+
+
+def build_manifest(data_repository, manifest_fp: str = None) -> dict:
+    """Builds the catalogue manifest from scratch, reading every passage. See update_manifest."""
+
+    return update_manifest(data_repository, manifest_fp)
+
+
+def load_manifest(data_repository, manifest_fp: str = None, rebuild: bool = False) -> dict:
+    """
+    Loads the catalogue manifest, building it first if it does not exist yet.
+    Passages added, removed or modified since the manifest was saved are updated.
+
+        ----------
+        arguments:
+
+            data_repository -> str : the path to the karst catalogue.
+            manifest_fp -> str : the manifest filepath, defaults to <data_repository>/manifest.json
+            rebuild -> bool : read every passage again.
+
+        ----------
+
+        returns :
+            dict with a list of passage records, with absolute filepaths.
+    """
+
+    data_repository = path.abspath(data_repository)
+    if manifest_fp is None:
+        manifest_fp = path.join(data_repository, "manifest.json")
+    if rebuild or not path.exists(manifest_fp):
+        return build_manifest(data_repository, manifest_fp)
+
+    with open(manifest_fp) as f:
+        previous = _relocate(json.load(f), ".", data_repository)
+    return update_manifest(data_repository, manifest_fp, previous)
+
+
+class CatalogueIndex:
+    """A bounding-box spatial index over the passages of a catalogue manifest.
+    The horizontal extent of each passage is taken from the header of its
+    point cloud, so that only passages sharing a coordinate system are comparable.
+
+    ----------
+
+        arguments:
+
+            manifest -> dict: a manifest as returned by build_manifest or load_manifest
+            sampling -> str: the point cloud used for the passage extents, "2mm" or "5cm"
+    """
+
+    def __init__(self, manifest: dict, sampling: str = "5cm"):
+
+        self.passages = [p for p in manifest["passages"] if sampling in p["clouds"]]
+        clouds = [p["clouds"][sampling] for p in self.passages]
+
+        # xmin, ymin, xmax, ymax of every passage.
+        self.bounds = np.array([c["bounds"] for c in clouds], dtype=float).reshape(-1, 6)[:, [0, 1, 3, 4]]
+        self.point_counts = np.array([c["point_count"] for c in clouds], dtype=np.int64)
+        self.georef = np.array([c["georef"] for c in clouds], dtype=bool)
+        self.epsg = np.array([p["epsg"] if p["epsg"] is not None else -1 for p in self.passages])
+
+    def query(self, bbox, epsg=None, georef_only: bool = True) -> list:
+        """
+        Finds the passages whose extent intersects a bounding box.
+
+            ----------
+            arguments:
+
+                bbox -> array-like : xmin, ymin, xmax, ymax
+                epsg -> int : only return passages in this coordinate system
+                georef_only -> bool : ignore passages in local coordinates
+
+            ----------
+
+            returns :
+                list of passage records.
+        """
+
+        xmin, ymin, xmax, ymax = bbox
+        mask = ((self.bounds[:, 0] <= xmax) & (self.bounds[:, 2] >= xmin) &
+                (self.bounds[:, 1] <= ymax) & (self.bounds[:, 3] >= ymin))
+        if georef_only:
+            mask &= self.georef
+        if epsg is not None:
+            mask &= self.epsg == epsg
+
+        return [self.passages[i] for i in np.flatnonzero(mask)]
+
+    def schedule(self, n_workers: int) -> list:
+        """
+        Splits the passages into n_workers jobs of similar total point count,
+        assigning the largest clouds first to the least loaded job.
+
+            ----------
+            arguments:
+
+                n_workers -> int : the number of jobs.
+
+            ----------
+
+            returns :
+                list of n_workers lists of passage filepaths.
+        """
+
+        jobs = [[] for _ in range(n_workers)]
+        loads = [(0, i) for i in range(n_workers)]
+
+        for i in np.argsort(-self.point_counts, kind="stable"):
+            load, job = heapq.heappop(loads)
+            jobs[job].append(self.passages[i]["filepath"])
+            heapq.heappush(loads, (load + int(self.point_counts[i]), job))
+
+        return jobs
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+File (Python):  'centreline_graph.py'
+author:         Tanguy Racine
+date:           2025
+
+Compact graph representation of the centrelines returned by process_centreline:
+- CSR node adjacency and per-branch edge offsets
+- vectorised morphometric queries (lengths, degrees, tortuosity, ...)
+- lazy loading from the ASCII centreline files of a passage directory
+"""
+
+import numpy as np
+import pandas as pd
+
+from functools import cached_property
+from os import path
+from scipy.spatial import cKDTree
+
+
+class CentrelineGraph:
+    """A centreline graph built from the nodes, edges and branches arrays written by
+    process_centreline. Adjacency is stored in compressed sparse row (CSR) format and
+    the edges of each branch are stored contiguously, with branch_offsets[b]:branch_offsets[b+1]
+    delimiting the edges of branch b in branch_edges.
+
+    All derived arrays are computed on first access and cached, so that a graph
+    loaded from disk only costs what is actually queried.
+
+    Node coordinates are in the original (unshifted) frame of the point cloud, i.e.
+    without the CloudCompare global shift, both when the graph is read from disk and
+    when it is built from the dictionary returned by process_centreline.
+
+    ----------
+
+        arguments:
+
+            nodes -> np.ndarray: N x 3 matrix of node coordinates
+            edges -> np.ndarray: E x 2 matrix of node indices
+            branches -> np.ndarray: M x 2 matrix of (branch index, edge index) pairs
+            name -> str: an optional name for the graph, e.g. Cave1_Passage1
+    """
+
+    def __init__(self,
+                 nodes: np.ndarray = None,
+                 edges: np.ndarray = None,
+                 branches: np.ndarray = None,
+                 name: str = None):
+
+        self.name = name
+        # the ASCII filepaths are only set when the graph is loaded lazily from disk.
+        self._filepaths = None
+
+        if nodes is not None:
+            self.__dict__["nodes"] = np.asarray(nodes, dtype=float).reshape(-1, 3)
+            self.__dict__["edges"] = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+            self.__dict__["branches"] = np.asarray(branches, dtype=np.int64).reshape(-1, 2)
+
+    ### constructors
+
+    @classmethod
+    def from_centreline(cls, centreline: dict, name: str = None):
+        """Builds a graph from the dictionary returned by process_centreline."""
+        return cls(centreline["nodes"], centreline["edges"], centreline["branches"], name=name)
+
+    @classmethod
+    def from_directory(cls, filepath: str):
+        """Sets up a graph reading the ASCII centreline files of a passage directory.
+        The files are only read when the nodes, edges or branches are first accessed.
+
+        ----------
+
+            arguments:
+
+                filepath -> str : the path to a specific cave passage directory.
+
+            returns : CentrelineGraph
+        """
+        cave, passage = path.normpath(filepath).split(path.sep)[-2:]
+
+        graph = cls(name=f"{cave}_{passage}")
+        graph._filepaths = dict(
+            nodes=path.join(filepath, "centreline", f"{cave}_{passage}_nodes_from_LBC.txt"),
+            edges=path.join(filepath, "centreline", f"{cave}_{passage}_links_from_LBC.txt"),
+            branches=path.join(filepath, "centreline", f"{cave}_{passage}_branches_from_LBC.txt"))
+        return graph
+
+    ### raw arrays (lazily read from disk)
+
+    def _load(self, key: str, dtype, ncols: int) -> np.ndarray:
+        if self._filepaths is None:
+            raise ValueError("the centreline graph has no data nor file to load it from.")
+        return np.loadtxt(self._filepaths[key], dtype=dtype, ndmin=2).reshape(-1, ncols)
+
+    @cached_property
+    def nodes(self) -> np.ndarray:
+        return self._load("nodes", float, 3)
+
+    @cached_property
+    def edges(self) -> np.ndarray:
+        return self._load("edges", np.int64, 2)
+
+    @cached_property
+    def branches(self) -> np.ndarray:
+        return self._load("branches", np.int64, 2)
+
+    ### compact structure
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edges)
+
+    @property
+    def n_branches(self) -> int:
+        return len(self.branch_offsets) - 1
+
+    @cached_property
+    def _csr(self) -> tuple:
+        # each undirected edge appears twice, once from each of its end nodes.
+        source = np.concatenate((self.edges[:, 0], self.edges[:, 1]))
+        target = np.concatenate((self.edges[:, 1], self.edges[:, 0]))
+        edge_id = np.tile(np.arange(self.n_edges), 2)
+
+        order = np.argsort(source, kind="stable")
+        indptr = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=self.n_nodes), out=indptr[1:])
+
+        return indptr, target[order], edge_id[order]
+
+    @property
+    def indptr(self) -> np.ndarray:
+        """CSR row pointers: the neighbours of node i are indices[indptr[i]:indptr[i+1]]."""
+        return self._csr[0]
+
+    @property
+    def indices(self) -> np.ndarray:
+        """CSR column indices, i.e. the neighbouring node indices."""
+        return self._csr[1]
+
+    @property
+    def incident_edges(self) -> np.ndarray:
+        """Edge indices aligned with indices, linking each node to its neighbour."""
+        return self._csr[2]
+
+    @cached_property
+    def _branch_structure(self) -> tuple:
+        # a stable sort keeps the order of the edges within each branch.
+        order = np.argsort(self.branches[:, 0], kind="stable")
+        _, branch_ids = np.unique(self.branches[order, 0], return_inverse=True)
+
+        n_branches = branch_ids.max() + 1 if len(branch_ids) else 0
+        offsets = np.zeros(n_branches + 1, dtype=np.int64)
+        np.cumsum(np.bincount(branch_ids, minlength=n_branches), out=offsets[1:])
+
+        return offsets, self.branches[order, 1], branch_ids
+
+    @property
+    def branch_offsets(self) -> np.ndarray:
+        """Offsets delimiting the edges of each branch in branch_edges."""
+        return self._branch_structure[0]
+
+    @property
+    def branch_edges(self) -> np.ndarray:
+        """Edge indices grouped by branch."""
+        return self._branch_structure[1]
+
+    def branch(self, b: int) -> np.ndarray:
+        """Returns the edge indices of branch b."""
+        return self.branch_edges[self.branch_offsets[b]:self.branch_offsets[b + 1]]
+
+    ### vectorised queries
+
+    @cached_property
+    def edge_lengths(self) -> np.ndarray:
+        return np.linalg.norm(self.nodes[self.edges[:, 1]] - self.nodes[self.edges[:, 0]], axis=1)
+
+    @cached_property
+    def degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    @property
+    def junctions(self) -> np.ndarray:
+        """Indices of the nodes where three or more edges meet."""
+        return np.flatnonzero(self.degrees >= 3)
+
+    @property
+    def junction_degrees(self) -> np.ndarray:
+        return self.degrees[self.junctions]
+
+    @property
+    def endpoints(self) -> np.ndarray:
+        """Indices of the nodes with a single edge, i.e. the passage terminations."""
+        return np.flatnonzero(self.degrees == 1)
+
+    @property
+    def total_length(self) -> float:
+        return float(self.edge_lengths.sum())
+
+    @cached_property
+    def branch_lengths(self) -> np.ndarray:
+        return np.bincount(self._branch_structure[2],
+                           weights=self.edge_lengths[self.branch_edges],
+                           minlength=self.n_branches)
+
+    @cached_property
+    def branch_ends(self) -> np.ndarray:
+        """n_branches x 2 matrix of the end nodes of each branch, -1 where a branch has
+        no two distinct ends (e.g. a loop)."""
+        branch_ids = self._branch_structure[2]
+        branch_nodes = self.edges[self.branch_edges]
+
+        # the ends of a branch are the nodes it visits only once.
+        keys = np.concatenate((branch_ids, branch_ids)) * self.n_nodes + branch_nodes.T.ravel()
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        end_keys = unique_keys[counts == 1]
+        end_branches, end_nodes = np.divmod(end_keys, self.n_nodes)
+
+        ends = np.full((self.n_branches, 2), -1, dtype=np.int64)
+        valid = np.bincount(end_branches, minlength=self.n_branches) == 2
+        # keys are sorted, so the two ends of a branch are consecutive.
+        first = np.flatnonzero(valid[end_branches])[::2]
+        ends[end_branches[first]] = np.column_stack((end_nodes[first], end_nodes[first + 1]))
+        return ends
+
+    @property
+    def tortuosity(self) -> np.ndarray:
+        """Ratio of branch length to the straight distance between branch ends (nan where undefined)."""
+        ends = self.branch_ends
+        chord = np.linalg.norm(self.nodes[ends[:, 1]] - self.nodes[ends[:, 0]], axis=1)
+        chord[(ends < 0).any(axis=1) | (chord == 0)] = np.nan
+        return self.branch_lengths / chord
+
+    @cached_property
+    def component_labels(self) -> np.ndarray:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+
+        adjacency = csr_matrix((np.ones(len(self.indices)), self.indices, self.indptr),
+                               shape=(self.n_nodes, self.n_nodes))
+        return connected_components(adjacency, directed=False)[1]
+
+    @property
+    def n_components(self) -> int:
+        return int(self.component_labels.max() + 1) if self.n_nodes else 0
+
+    @cached_property
+    def _tree(self) -> cKDTree:
+        return cKDTree(self.nodes)
+
+    def nearest_node(self, points: np.ndarray) -> tuple:
+        """Finds the closest centreline node to each point.
+
+        ----------
+
+            arguments:
+
+                points -> np.ndarray: a 3 x 1 vector or N x 3 matrix of coordinates,
+                in the original frame (add no CloudCompare global shift)
+
+            returns :
+                distances -> the distance to the nearest node
+                indices -> the index of the nearest node
+        """
+        return self._tree.query(points, workers=-1)
+
+    def summary(self) -> dict:
+        """A dictionary of the main morphometric statistics of the centreline."""
+        tortuosity = self.tortuosity
+        return dict(name=self.name,
+                    n_nodes=self.n_nodes,
+                    n_edges=self.n_edges,
+                    n_branches=self.n_branches,
+                    n_components=self.n_components,
+                    n_junctions=len(self.junctions),
+                    n_endpoints=len(self.endpoints),
+                    total_length=self.total_length,
+                    mean_branch_length=float(self.branch_lengths.mean()) if self.n_branches else np.nan,
+                    mean_tortuosity=float(np.nanmean(tortuosity)) if np.isfinite(tortuosity).any() else np.nan)
+
+
+def centreline_statistics(passages_fp: list) -> pd.DataFrame:
+    """Collects the morphometric statistics of the centrelines of a list of passages.
+
+    ----------
+
+        arguments:
+
+            passages_fp -> list : the paths to the cave passage directories.
+
+        returns : pandas.DataFrame with one row per passage
+    """
+    rows = []
+    for fp in passages_fp:
+        graph = CentrelineGraph.from_directory(fp)
+        try:
+            rows.append(graph.summary())
+        except (FileNotFoundError, OSError):
+            print(f"no centreline to process in {fp}")
+
+    return pd.DataFrame(rows)
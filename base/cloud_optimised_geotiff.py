@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+File (Python):  'cloud_optimised_geotiff.py'
+author:         Tanguy Racine
+date:           2025
+
+Raster post-processing with GDAL:
+- conversion of GeoTIFFs to tiled, compressed cloud-optimised GeoTIFFs with overviews
+- catalogue-wide virtual mosaics (VRT) of the floor and ceiling rasters
+"""
+
+import numpy as np
+
+from glob import glob
+from os import path, replace, remove
+from osgeo import gdal
+
+# local files.
+from base.catalogue import load_manifest
+
+gdal.UseExceptions()
+
+### cloud-optimised GeoTIFF default creation options
+COG_ARGS = dict(compress = "DEFLATE", # lossless compression of the raster tiles.
+                blocksize = 512, # internal tile size in pixels.
+                resampling = "AVERAGE", # resampling used to compute the overview levels.
+                nodata = None) # nodata value for empty cells, defaults to the existing one or NaN.
+
+
+def to_cloud_optimised_geotiff(raster_fp, cog_args: dict = COG_ARGS, epsg: int = None) -> str:
+    """
+    Converts a GeoTIFF to an internally tiled, compressed cloud-optimised GeoTIFF
+    with overviews, replacing the original file. The rasters written by CloudCompare
+    have no coordinate system, so it is assigned here when epsg is given.
+
+        ----------
+        arguments:
+
+            raster_fp -> str : the path to the GeoTIFF file.
+            cog_args -> dict : the creation options, see COG_ARGS.
+            epsg -> int : the EPSG code of the raster coordinate system, optional.
+
+        ----------
+
+        returns :
+            str, the path to the converted file.
+    """
+
+    src = gdal.Open(raster_fp)
+    band = src.GetRasterBand(1)
+
+    # empty cells are flagged as nodata so that they are skipped in the overviews and GIS software.
+    nodata = cog_args["nodata"]
+    if nodata is None:
+        nodata = band.GetNoDataValue()
+    if nodata is None and gdal.GetDataTypeName(band.DataType).startswith("Float"):
+        nodata = np.nan
+
+    # floating point elevations compress better with the floating point predictor.
+    predictor = "FLOATING_POINT" if gdal.GetDataTypeName(band.DataType).startswith("Float") else "STANDARD"
+
+    creation_options = [f"COMPRESS={cog_args['compress']}",
+                        f"PREDICTOR={predictor}",
+                        f"BLOCKSIZE={cog_args['blocksize']}",
+                        f"RESAMPLING={cog_args['resampling']}",
+                        "OVERVIEWS=IGNORE_EXISTING",
+                        "NUM_THREADS=ALL_CPUS",
+                        "BIGTIFF=IF_SAFER"]
+
+    tmp_fp = f"{path.splitext(raster_fp)[0]}_cog.tmp.tif"
+    try:
+        gdal.Translate(tmp_fp, src, format="COG", noData=nodata,
+                       outputSRS=f"EPSG:{epsg}" if epsg is not None else None,
+                       creationOptions=creation_options)
+    except RuntimeError:
+        if path.exists(tmp_fp):
+            remove(tmp_fp)
+        raise
+    finally:
+        src = None
+
+    replace(tmp_fp, raster_fp)
+    return raster_fp
+
+
+def build_raster_mosaics(data_repository, surfaces: tuple = ("floor", "ceiling"), pattern: str = "*_{surface}_*.tif") -> list:
+    """
+    Builds a virtual mosaic (VRT) of the rasters of all passages for each surface
+    and coordinate system, e.g. <data_repository>/floor_EPSG2056.vrt. The rasters
+    are referenced, not copied, so the index stays small and reads remain partial.
+    Passages are grouped by the coordinate system recorded in the catalogue manifest,
+    and those rasterised from a cloud in local coordinates are left out.
+
+        ----------
+        arguments:
+
+            data_repository -> str : the path to the karst catalogue.
+            surfaces -> tuple : the surfaces to be indexed.
+            pattern -> str : the raster filename pattern, formatted with the surface name.
+
+        ----------
+
+        returns :
+            list of the VRT filepaths.
+    """
+
+    # the rasters are extracted from the 2mm clouds, see extract_raster.
+    raster_folders = {}
+    for passage in load_manifest(data_repository)["passages"]:
+        cloud = passage["clouds"].get("2mm")
+        if passage["epsg"] is not None and cloud is not None and cloud["georef"]:
+            raster_folders.setdefault(passage["epsg"], []).append(path.join(passage["filepath"], "raster"))
+
+    mosaics = []
+    for surface in surfaces:
+        for epsg, folders in sorted(raster_folders.items()):
+            group = sorted(raster_fp for folder in folders
+                           for raster_fp in glob(path.join(folder, pattern.format(surface=surface)))
+                           if not raster_fp.endswith("_cog.tmp.tif"))
+            if not group:
+                continue
+
+            vrt_fp = path.join(data_repository, f"{surface}_EPSG{epsg}.vrt")
+            vrt = gdal.BuildVRT(vrt_fp, group, resolution="highest", bandList=[1])
+            vrt = None
+
+            print(f"{len(group)} {surface} rasters indexed in {vrt_fp}")
+            mosaics.append(vrt_fp)
+
+    return mosaics
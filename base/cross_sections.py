@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+File (Python):  'cross_sections.py'
+author:         Tanguy Racine
+date:           2025
+
+Passage cross-section profiles along the centreline:
+- sections sampled at a fixed spacing along each branch
+- cloud points assigned to section slabs with a single batched KD-tree query per chunk
+- width, floor-to-ceiling height and area of every section
+"""
+
+import numpy as np
+import cloudComPy as cc
+
+from os import path
+from scipy.spatial import cKDTree
+
+# local files.
+from base.catalogue import find_cloud_filepath
+from base.centreline_graph import CentrelineGraph
+from base.spanning_tree import chain_edges, walk_branches
+
+### cross-section default keyword arguments
+CS_ARGS = dict(spacing = 1.0, # distance between consecutive sections along a branch [m].
+               thickness = 0.1, # thickness of the slab of points kept around each section plane [m].
+               max_radius = 10.0, # maximum distance of a point to the section centre [m].
+               n_sectors = 72, # number of angular sectors used to compute the section area.
+               chunk_size = 1_000_000) # number of cloud points processed at once.
+
+SECTION_COLUMNS = ["branch", "chainage", "x", "y", "z", "width", "height", "area", "n_points"]
+
+
+def _oriented_branch_edges(graph: CentrelineGraph) -> tuple:
+    """Returns the start and end nodes of the edges in graph.branch_edges, each branch
+    being walked in order from one of its ends to the other, keeping the saved branch
+    labels. Raises a ValueError if a branch is not a simple path."""
+
+    offsets = graph.branch_offsets
+    edges = graph.edges[graph.branch_edges]
+    if len(edges) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    branch_of = graph._branch_structure[2]
+    next_edge = chain_edges(edges, branch_of, graph.n_nodes)
+
+    # start each branch from the edge holding its first end, -1 for loops and forks.
+    ends = graph.branch_ends[:, 0]
+    position, side = np.nonzero(next_edge < 0)
+    at_first_end = edges[position, side] == ends[branch_of[position]]
+    position, side = position[at_first_end], side[at_first_end]
+    _, first = np.unique(branch_of[position], return_index=True)
+
+    start = np.full(graph.n_branches, -1, dtype=np.int64)
+    entry_side = np.zeros(graph.n_branches, dtype=np.int64)
+    start[branch_of[position[first]]] = position[first]
+    entry_side[branch_of[position[first]]] = side[first]
+
+    # only simple paths are walked, a fork leaves the rest of its branch unvisited.
+    walked = start >= 0
+    _, oriented = walk_branches(edges, next_edge, start[walked], entry_side[walked],
+                                offsets, branches=np.flatnonzero(walked))
+
+    invalid = np.unique(branch_of[oriented[:, 0] < 0])
+    if len(invalid):
+        labels = np.unique(graph.branches[:, 0])[invalid]
+        raise ValueError(f"centreline branches {labels.tolist()} of {graph.name} are not simple paths.")
+
+    return oriented[:, 0], oriented[:, 1]
+
+
+def sample_sections(graph: CentrelineGraph, spacing: float = 1.0) -> dict:
+    """
+    Samples section positions at a fixed spacing along each branch of a centreline.
+
+        ----------
+        arguments:
+
+            graph -> CentrelineGraph : the centreline graph.
+            spacing -> float : the distance between consecutive sections in m.
+
+        ----------
+
+        returns :
+            dict with the branch index, chainage along the branch, centre and unit tangent of each section.
+    """
+
+    start, end = _oriented_branch_edges(graph)
+    vectors = graph.nodes[end] - graph.nodes[start]
+    lengths = np.linalg.norm(vectors, axis=1)
+
+    offsets = graph.branch_offsets
+    edge_end = np.cumsum(lengths)
+    branch_start = np.concatenate(([0], edge_end))[offsets[:-1]]
+    branch_lengths = np.add.reduceat(lengths, offsets[:-1]) if len(lengths) else np.zeros(0)
+
+    # sections at 0, spacing, 2 * spacing, ... along each branch.
+    n_samples = np.floor(branch_lengths / spacing).astype(np.int64) + 1
+    branch = np.repeat(np.arange(graph.n_branches), n_samples)
+    chainage = (np.arange(n_samples.sum()) - np.repeat(np.cumsum(n_samples) - n_samples, n_samples)) * spacing
+
+    # locate the edge holding each section, staying within its branch.
+    position = np.searchsorted(edge_end, branch_start[branch] + chainage, side="right")
+    position = np.clip(position, offsets[branch], offsets[branch + 1] - 1)
+
+    fraction = np.divide(branch_start[branch] + chainage - (edge_end[position] - lengths[position]),
+                         lengths[position], out=np.zeros(len(position)), where=lengths[position] > 0)
+    centres = graph.nodes[start[position]] + np.clip(fraction, 0, 1)[:, None] * vectors[position]
+    tangents = vectors[position] / np.where(lengths[position] > 0, lengths[position], 1)[:, None]
+
+    return dict(branch=branch, chainage=chainage, centres=centres, tangents=tangents)
+
+
+def section_frames(tangents: np.ndarray) -> tuple:
+    """Returns the horizontal (lateral) and upward unit vectors spanning each section plane."""
+
+    lateral = np.cross(tangents, [0, 0, 1])
+    norm = np.linalg.norm(lateral, axis=1)
+    # vertical shafts have no horizontal normal, fall back to the x axis.
+    lateral[norm < 1e-6] = [1, 0, 0]
+    lateral /= np.linalg.norm(lateral, axis=1)[:, None]
+    upward = np.cross(lateral, tangents)
+
+    return lateral, upward
+
+
+def section_profiles(sections: dict,
+                     xyz: np.ndarray,
+                     classification: np.ndarray = None,
+                     thickness: float = 0.1,
+                     max_radius: float = 10.0,
+                     n_sectors: int = 72,
+                     chunk_size: int = 1_000_000) -> dict:
+    """
+    Measures the width, floor-to-ceiling height and area of all sections at once.
+    Each cloud point is assigned to the nearest section whose slab contains it,
+    the cloud being processed in chunks so that memory use stays bounded.
+
+        ----------
+        arguments:
+
+            sections -> dict : the sections returned by sample_sections.
+            xyz -> np.ndarray : the cloud coordinates (N x 3 matrix).
+            classification -> np.ndarray : the point classification (1: ceiling, 2: floor), optional.
+            thickness -> float : the slab thickness in m.
+            max_radius -> float : the maximum distance of a point to the section centre in m.
+            n_sectors -> int : the number of angular sectors used for the area.
+            chunk_size -> int : the number of points processed at once.
+
+        ----------
+
+        returns :
+            dict with the width, height, area and number of points of each section.
+    """
+
+    centres, tangents = sections["centres"], sections["tangents"]
+    lateral, upward = section_frames(tangents)
+    n_sections = len(centres)
+
+    u_min = np.full(n_sections, np.inf)
+    u_max = np.full(n_sections, -np.inf)
+    ceiling = np.full(n_sections, -np.inf)
+    floor = np.full(n_sections, np.inf)
+    n_points = np.zeros(n_sections, dtype=np.int64)
+    radius = np.zeros(n_sections * n_sectors)
+
+    tree = cKDTree(centres)
+    k = min(4, n_sections)
+
+    chunks = range(0, len(xyz), chunk_size) if n_sections else []
+    for lo in chunks:
+        chunk = xyz[lo:lo + chunk_size]
+
+        # candidate sections for every point, closest first.
+        distances, candidates = tree.query(chunk, k=k, distance_upper_bound=max_radius, workers=-1)
+        distances, candidates = distances.reshape(len(chunk), k), candidates.reshape(len(chunk), k)
+        valid = candidates < n_sections
+        candidates[~valid] = 0
+
+        offset = chunk[:, None, :] - centres[candidates]
+        along = np.einsum("mkj,mkj->mk", offset, tangents[candidates])
+        in_slab = valid & (np.abs(along) <= thickness / 2)
+
+        kept = np.flatnonzero(in_slab.any(axis=1))
+        section = candidates[kept, np.argmax(in_slab[kept], axis=1)]
+        offset = chunk[kept] - centres[section]
+
+        u = np.einsum("mj,mj->m", offset, lateral[section])
+        w = np.einsum("mj,mj->m", offset, upward[section])
+
+        np.minimum.at(u_min, section, u)
+        np.maximum.at(u_max, section, u)
+        n_points += np.bincount(section, minlength=n_sections)
+
+        if classification is None:
+            is_ceiling = is_floor = np.ones(len(kept), dtype=bool)
+        else:
+            point_class = classification[lo:lo + chunk_size][kept]
+            is_ceiling, is_floor = point_class == 1, point_class == 2
+        np.maximum.at(ceiling, section[is_ceiling], w[is_ceiling])
+        np.minimum.at(floor, section[is_floor], w[is_floor])
+
+        # furthest point in each angular sector around the section centre.
+        sector = ((np.arctan2(w, u) + np.pi) / (2 * np.pi) * n_sectors).astype(np.int64) % n_sectors
+        np.maximum.at(radius, section * n_sectors + sector, np.hypot(u, w))
+
+    # area of the polygon joining the furthest points of consecutive sectors.
+    radius = radius.reshape(n_sections, n_sectors)
+    area = 0.5 * np.sin(2 * np.pi / n_sectors) * np.sum(radius * np.roll(radius, -1, axis=1), axis=1)
+
+    empty = n_points == 0
+    width = np.where(empty, np.nan, u_max - u_min)
+    height = ceiling - floor
+    height[~np.isfinite(height)] = np.nan
+    area[empty] = np.nan
+
+    return dict(width=width, height=height, area=area, n_points=n_points)
+
+
+def extract_cross_sections(filepath, cs_args: dict = CS_ARGS, sampling: str = "5cm") -> np.ndarray:
+    """
+    A wrapper to generate the cross-section profiles of a passage from its centreline
+    and classified point cloud. The profiles are written as an ASCII table in the
+    centreline folder, with one row per section.
+
+        ----------
+        arguments:
+
+            filepath -> str : the path to a specific cave passage directory.
+            cs_args -> dict : the cross-section arguments, see CS_ARGS.
+            sampling -> str : the point cloud sampling, either "2mm" or "5cm"
+
+        ----------
+
+        returns :
+            np.ndarray with the columns listed in SECTION_COLUMNS
+    """
+
+    cave, passage = filepath.split(path.sep)[-2:]
+    print(f"processing {passage} in {cave}")
+
+    cloud_fp = find_cloud_filepath(filepath, sampling=sampling)
+    if cloud_fp is None:
+        print("no cloud to process here")
+        return None
+
+    cloud = cc.loadPointCloud(cloud_fp)
+
+    # the centreline nodes are saved in the original coordinates, while the cloud is shifted.
+    global_shift = np.array(cloud.getGlobalShift())
+    xyz = cloud.toNpArrayCopy()
+
+    sf_dic = cloud.getScalarFieldDic()
+    classification = cloud.getScalarField(sf_dic["Classification"]).toNpArrayCopy() if "Classification" in sf_dic else None
+    cc.deleteEntity(cloud)
+
+    graph = CentrelineGraph.from_directory(filepath)
+    sections = sample_sections(graph, spacing=cs_args["spacing"])
+
+    # measure the sections in the shifted frame of the cloud.
+    shifted_sections = {**sections, "centres": sections["centres"] + global_shift}
+    profiles = section_profiles(shifted_sections, xyz, classification, **{k: v for k, v in cs_args.items() if k != "spacing"})
+
+    table = np.column_stack((sections["branch"],
+                             sections["chainage"],
+                             sections["centres"],
+                             profiles["width"],
+                             profiles["height"],
+                             profiles["area"],
+                             profiles["n_points"]))
+
+    sections_fp = path.join(filepath, "centreline", f"{cave}_{passage}_sections_from_LBC.txt")
+    np.savetxt(sections_fp, table, fmt=["%d", "%.2f", "%.3f", "%.3f", "%.3f", "%.3f", "%.3f", "%.3f", "%d"],
+               header=" ".join(SECTION_COLUMNS))
+
+    return table
@@ -9,11 +9,22 @@ date:           2025
 Wrapper for raster extraction routines in CloudComPy
 """
 
+from glob import glob, escape
 from os import path 
 import cloudComPy as cc
 
+# local files.
+from base.catalogue import find_cloud_filepath, read_crs
+from base.cloud_optimised_geotiff import to_cloud_optimised_geotiff
 
-def extract_raster(filepath, raster_grid = 0.04)-> None:
+
+def cloud_rasters(raster_filepath, cloud_name: str) -> list:
+    """Lists the GeoTIFF files written by CloudCompare for a cloud, named after the cloud."""
+    rasters = glob(path.join(escape(raster_filepath), f"{escape(cloud_name)}*.tif"))
+    return sorted(fp for fp in rasters if not fp.endswith("_cog.tmp.tif"))
+
+
+def extract_raster(filepath, raster_grid = 0.04, cloud_optimised = True)-> None:
     """
     A wrapper to generate a series of floor and ceiling raster files
     from a given cave filepath. 
@@ -23,6 +34,7 @@ def extract_raster(filepath, raster_grid = 0.04)-> None:
 
             filepath -> str : the filename
             raster_grid -> float : the raster grid size in m
+            cloud_optimised -> bool : convert the rasters to cloud-optimised GeoTIFFs
 
         ----------
         
@@ -32,18 +44,21 @@ def extract_raster(filepath, raster_grid = 0.04)-> None:
     """
 
     cave, passage = filepath.split(path.sep)[-2:]
-    cloud_filepath = path.join(filepath, "pointclouds", f"{cave}_{passage}_sampled_2mm_PCV_normals_classified_georef.las")
     raster_floor_filepath = path.join(filepath, "raster")
     raster_ceiling_filepath = path.join(filepath, "raster")
-    cloud = cc.loadPointCloud(cloud_filepath)
 
-    # if no georeferenced file exists, load one in local coordinates.
-    if cloud is None:
-         # downsampled cloud filepath.
-        cloud_filepath = path.join(filepath, "pointclouds", f"{cave}_{passage}_sampled_2mm_PCV_normals_classified.las")
+    # use the georeferenced file if it exists, otherwise the one in local coordinates.
+    cloud_filepath = find_cloud_filepath(filepath, sampling="2mm")
+
+    if cloud_filepath is None:
+        print("no cloud to process here")
+        return
 
     print(cloud_filepath)
     cloud = cc.loadPointCloud(cloud_filepath)
+
+    # CloudCompare does not write a coordinate system, use the one of the passage if georeferenced.
+    epsg = read_crs(filepath) if cloud_filepath.endswith("_georef.las") else None
     
     classif_idx = cloud.getScalarFieldDic()["Classification"]
     cloud.setCurrentScalarField(classif_idx)
@@ -65,6 +80,7 @@ def extract_raster(filepath, raster_grid = 0.04)-> None:
         print("filtering ceiling outliers")
         reference_cloud = cc.CloudSamplingTools.sorFilter(offground, knn=24)
         (offground_filtered, res) = offground.partialClone(reference_cloud)
+        offground_filtered.setName(offground.getName())
 
         print("pre-filtering size: ", offground.size())
         print("post-filtering size: ", offground_filtered.size())
@@ -77,10 +93,17 @@ def extract_raster(filepath, raster_grid = 0.04)-> None:
                             pathToImages=raster_ceiling_filepath,
                             projectionType= cc.ProjectionType.PROJ_MEDIAN_VALUE,
                             emptyCellFillStrategy=cc.EmptyCellFillOption.LEAVE_EMPTY)
+
+        if cloud_optimised:
+            # tile, compress and add overviews to the ceiling rasters.
+            for raster_fp in cloud_rasters(raster_ceiling_filepath, offground_filtered.getName()):
+                print("converting to cloud-optimised GeoTIFF: ", raster_fp)
+                to_cloud_optimised_geotiff(raster_fp, epsg=epsg)
         
         print("filtering ground outliers.")
         reference_cloud = cc.CloudSamplingTools.sorFilter(ground, knn=24)
         (ground_filtered, res) = ground.partialClone(reference_cloud)
+        ground_filtered.setName(ground.getName())
 
         print("pre-filtering size: ", ground.size())
         print("post-filtering size: ", ground_filtered.size())
@@ -93,6 +116,12 @@ def extract_raster(filepath, raster_grid = 0.04)-> None:
                             projectionType= cc.ProjectionType.PROJ_MEDIAN_VALUE,
                             emptyCellFillStrategy=cc.EmptyCellFillOption.LEAVE_EMPTY)
         
+        if cloud_optimised:
+            # tile, compress and add overviews to the floor rasters.
+            for raster_fp in cloud_rasters(raster_floor_filepath, ground_filtered.getName()):
+                print("converting to cloud-optimised GeoTIFF: ", raster_fp)
+                to_cloud_optimised_geotiff(raster_fp, epsg=epsg)
+
         # clean up memory.
         cc.deleteEntity(ground)
         cc.deleteEntity(offground)
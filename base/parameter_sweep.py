@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+File (Python):  'parameter_sweep.py'
+author:         Tanguy Racine
+date:           2025
+
+Parameter sweep of the Laplacian-based contraction and centreline settings:
+- each cloud is loaded and downsampled once per down_sample value
+- the parameter combinations run in parallel worker processes
+- runtime and skeleton quality metrics are recorded per combination
+"""
+
+import numpy as np
+import pandas as pd
+import cloudComPy as cc
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from os import path, cpu_count
+from scipy.spatial import cKDTree
+from threadpoolctl import threadpool_limits
+from time import time
+
+# local files.
+from base.catalogue import find_cloud_filepath
+from base.centreline_graph import CentrelineGraph
+from base.process_centreline import LBC_ARGS, CT_ARGS, contract_cloud, build_centreline, branches_from_index
+from base.utils import array_to_o3d
+
+### example parameter grid, each key maps to the list of values to be tested.
+SWEEP_GRID = dict(init_contraction = [0.5, 1.0, 2.0],
+                  init_attraction = [0.5, 1.0],
+                  down_sample = [0.2, 0.4])
+
+### number of worker processes, each running the multithreaded contraction solver.
+N_WORKERS = 2
+
+
+def parameter_combinations(grid: dict) -> list:
+    """
+    Expands a parameter grid into a list of (lbc_args, ct_args) pairs, completing
+    each combination with the default LBC_ARGS and CT_ARGS values. Parameters
+    that are not centreline arguments are passed on to the contraction algorithm.
+
+        ----------
+        arguments:
+
+            grid -> dict : parameter names mapped to lists of values.
+
+        ----------
+
+        returns :
+            list of (lbc_args, ct_args) tuples
+    """
+
+    keys = list(grid)
+    combinations = []
+    for values in product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, values))
+        lbc_args = {**LBC_ARGS, **{k: v for k, v in params.items() if k not in CT_ARGS}}
+        ct_args = {**CT_ARGS, **{k: v for k, v in params.items() if k in CT_ARGS}}
+        combinations.append((lbc_args, ct_args))
+    return combinations
+
+
+def _limit_threads(n_threads: int) -> None:
+    """Worker initialiser: caps the threads of the numerical libraries so that workers share the CPUs."""
+    threadpool_limits(limits=n_threads)
+
+
+def _run_combination(pcd: np.ndarray, local_shift: np.ndarray, lbc_args: dict, ct_args: dict) -> tuple:
+    """Worker routine: contracts an already downsampled cloud and builds its centreline."""
+
+    s = time()
+    # the cloud was downsampled once beforehand, so LBC must not downsample it again.
+    coords = contract_cloud(pcd, {**lbc_args, "down_sample": -1}) + local_shift
+    nodes, edge_index, branch_index, n_components = build_centreline(coords, ct_args)
+
+    return time() - s, nodes, edge_index.T, branches_from_index(branch_index), n_components
+
+
+def sweep_centreline(filepath, grid: dict = SWEEP_GRID, n_workers: int = N_WORKERS) -> pd.DataFrame:
+    """
+    Runs the centreline extraction of a passage for every combination of a
+    parameter grid and records the runtime and skeleton quality metrics:
+    node count, number of connected components of the thinned contracted cloud
+    (before the largest one is kept), total length and distance of nodes to the cloud.
+    The table is saved in the centreline folder of the passage.
+
+        ----------
+        arguments:
+
+            filepath -> str : the path to a specific cave passage directory.
+            grid -> dict : parameter names mapped to lists of values.
+            n_workers -> int : the number of worker processes, the CPUs being shared between them.
+
+        ----------
+
+        returns :
+            pandas.DataFrame with one row per parameter combination.
+    """
+
+    cave, passage = filepath.split(path.sep)[-2:]
+    print(f"sweeping {passage} in {cave}")
+
+    cloud_fp = find_cloud_filepath(filepath, sampling="5cm")
+    if cloud_fp is None:
+        print("no cloud to process here")
+        return None
+
+    # load the cloud once and work in locally shifted coordinates.
+    cc_cloud = cc.loadPointCloud(cloud_fp)
+    global_shift = np.array(cc_cloud.getGlobalShift())
+    cloud = cc_cloud.toNpArrayCopy()
+    cc.deleteEntity(cc_cloud)
+
+    local_shift = np.mean(cloud, axis = 0)
+    shifted_cloud = cloud - local_shift
+
+    # nodes are compared to the full cloud to measure how well they follow the conduit.
+    cloud_tree = cKDTree(cloud)
+
+    combinations = parameter_combinations(grid)
+
+    # downsample the cloud once for each distinct down_sample value.
+    downsampled = {}
+    for lbc_args, _ in combinations:
+        down_sample = lbc_args["down_sample"]
+        if down_sample not in downsampled:
+            if down_sample == -1:
+                downsampled[down_sample] = shifted_cloud
+            else:
+                pcd = array_to_o3d(shifted_cloud).voxel_down_sample(down_sample)
+                downsampled[down_sample] = np.asarray(pcd.points)
+
+    rows = []
+    n_threads = max(1, (cpu_count() or 1) // n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_limit_threads, initargs=(n_threads,)) as executor:
+        futures = [executor.submit(_run_combination, downsampled[lbc_args["down_sample"]],
+                                   local_shift, lbc_args, ct_args)
+                   for lbc_args, ct_args in combinations]
+
+        for (lbc_args, ct_args), future in zip(combinations, futures):
+            row = dict(cave=cave, passage=passage, **lbc_args, **ct_args)
+
+            if future.exception() is not None:
+                print(f"combination {lbc_args | ct_args} failed: {future.exception()}")
+                rows.append(row)
+                continue
+
+            # the nodes are in the shifted frame of the cloud, the graph in the original one.
+            runtime, nodes, edges, branches, n_components = future.result()
+            graph = CentrelineGraph(nodes - global_shift, edges, branches)
+            distances, _ = cloud_tree.query(nodes, workers=-1)
+
+            row.update(runtime=runtime,
+                       n_nodes=graph.n_nodes,
+                       n_components=n_components,
+                       n_branches=graph.n_branches,
+                       total_length=graph.total_length,
+                       mean_distance_to_cloud=float(distances.mean()),
+                       max_distance_to_cloud=float(distances.max()))
+            rows.append(row)
+
+    sweep = pd.DataFrame(rows)
+
+    sweep_fp = path.join(filepath, "centreline", f"{cave}_{passage}_sweep_from_LBC.csv")
+    sweep.to_csv(sweep_fp, index=False)
+    return sweep
+
+
+def sweep_catalogue(passages_fp: list, grid: dict = SWEEP_GRID, n_workers: int = N_WORKERS) -> pd.DataFrame:
+    """Runs the parameter sweep on a list of passages and gathers the results in a single table."""
+
+    sweeps = [sweep_centreline(fp, grid, n_workers) for fp in passages_fp]
+    sweeps = [sweep for sweep in sweeps if sweep is not None]
+
+    return pd.concat(sweeps, ignore_index=True) if sweeps else pd.DataFrame()
@@ -11,7 +11,6 @@ Wrapper for point cloud contraction and centreline topological reconstruction
 
 import numpy as np
 import matplotlib.pyplot as plt
-import mistree_pp as mist
 import cloudComPy as cc
 
 from os import path 
@@ -19,6 +18,8 @@ from pc_skeletor import LBC
 from time import time
 
 # local files.
+from base.catalogue import find_cloud_filepath
+from base.spanning_tree import get_mst_branches
 from base.to_dxf import to_DXF
 from base.to_geojsons import to_geojsons
 from base.utils import array_to_o3d, spatially_downsample, return_largest_component
@@ -32,7 +33,8 @@ LBC_ARGS = dict(init_contraction = 0.5,
 CT_ARGS = dict(centreline_min_distance = 0.5,  # minimum distance between spatially downsampled points of a centreline.
                octree_level = 8, # threshold distance for connected component analysis. 
                min_component_size = 5,  # minimum component size in connected component analysis.
-               knn = 12) # number of nearest neighbours to be considered when building the minimum spanning tree of a thinned graph.
+               knn = 12, # number of nearest neighbours to be considered when building the minimum spanning tree of a thinned graph.
+               mst_backend = "scipy") # minimum spanning tree implementation, either "scipy" or "mistree".
 
 def extract_skeleton(pcd: np.ndarray, 
                     ct_args: dict = CT_ARGS,
@@ -66,8 +68,35 @@ def extract_skeleton(pcd: np.ndarray,
     # local shift
     local_shift = np.mean(pcd, axis = 0)
     
+    # contract the shifted cloud, keeping the coordinates small.
+    coords = contract_cloud(pcd - local_shift, lbc_args) + local_shift
+
+    nodes, edge_index, branch_index, _ = build_centreline(coords, ct_args)
+
+    e = time()
+    print(f"cloud contraction done in {e-s}s")
+    return local_shift, e-s, nodes, edge_index, branch_index
+
+def contract_cloud(pcd: np.ndarray,
+                   lbc_args: dict = LBC_ARGS
+                   )-> np.ndarray:
+    """Runs the Laplacian-based contraction on an array of (locally shifted) coordinates.
+
+        ----------
+        
+        arguments:
+
+            pcd -> np.ndarray: a numpy array with N coordinates (N x 3 matrix)
+            lbc_args -> dict : a dictionary containing the laplacian-based contraction algorithms
+
+        ----------
+        
+        returns :
+            coords -> np.ndarray: the contracted coordinates
+    """
+    
     # convert to open3d object-
-    shifted_pcd = array_to_o3d(pcd - local_shift)
+    shifted_pcd = array_to_o3d(pcd)
     
     # set up the Laplacian-based contraction algorithm 
     lbc = LBC(point_cloud=shifted_pcd, **lbc_args)
@@ -78,25 +107,59 @@ def extract_skeleton(pcd: np.ndarray,
     # extract the first topology from LBC (this is usually rough and not very useful.)
     lbc.extract_topology()
 
-    coords = np.asarray(lbc.contracted_point_cloud.points) + local_shift
+    return np.asarray(lbc.contracted_point_cloud.points)
+
+def build_centreline(coords: np.ndarray,
+                     ct_args: dict = CT_ARGS
+                     )-> tuple:
+    """Thins a contracted cloud and reconstructs the centreline topology.
+
+        ----------
+        
+        arguments:
+
+            coords -> np.ndarray: the contracted coordinates (N x 3 matrix)
+            ct_args -> dict : a dictionary containing the centreline downsampling and clean up arguments
+
+        ----------
+        
+        returns :
+            nodes -> N x 3 matrix
+            edge_index -> 2 x (N-1) matrix
+            branch_index -> list of arrays of edge indices
+            n_components -> int: the number of connected components found before keeping the largest
+    """
     
     downsampled_coords = spatially_downsample(coords, 
                                               min_distance=ct_args["centreline_min_distance"])
 
     # perform connected component analysis to get rid of erroneous data points that sometimes appear 
-    cc0_downsampled_coords = return_largest_component(downsampled_coords, 
+    cc0_downsampled_coords, n_components = return_largest_component(downsampled_coords, 
                                     octree_level = ct_args["octree_level"],
-                                    min_component_size= ct_args["min_component_size"])
+                                    min_component_size= ct_args["min_component_size"],
+                                    return_n_components= True)
     
     
-    # unpack the x, y and z coordinates.
-    mst = mist.GetMST(*cc0_downsampled_coords.T)
-    
-    _, _, _, _, edge_index, branch_index = mst.get_stats(include_index=True, k_neighbours= ct_args["knn"])
+    if ct_args.get("mst_backend", "scipy") == "mistree":
+        # mistree is only imported when explicitly requested.
+        import mistree_pp as mist
 
-    e = time()
-    print(f"cloud contraction done in {e-s}s")
-    return local_shift, e-s, cc0_downsampled_coords, edge_index, branch_index
+        # unpack the x, y and z coordinates.
+        mst = mist.GetMST(*cc0_downsampled_coords.T)
+        
+        _, _, _, _, edge_index, branch_index = mst.get_stats(include_index=True, k_neighbours= ct_args["knn"])
+    else:
+        edge_index, branch_index = get_mst_branches(cc0_downsampled_coords, k_neighbours= ct_args["knn"])
+
+    return cc0_downsampled_coords, edge_index, branch_index, n_components
+
+def branches_from_index(branch_index: list) -> np.ndarray:
+    """Flattens a list of per-branch edge indices into a M x 2 matrix of (branch index, edge index) pairs."""
+
+    edge_branch_index = np.repeat(np.arange(len(branch_index)), [len(branch) for branch in branch_index])
+    flat_branch_index = np.hstack(branch_index).flatten() if len(branch_index) else np.array([], dtype=int)
+
+    return np.vstack((edge_branch_index, flat_branch_index)).T
 
 def process_centreline(filepath, lbc_args, ct_args) -> dict:
     """
@@ -122,16 +185,12 @@ def process_centreline(filepath, lbc_args, ct_args) -> dict:
 
     print(f"processing {passage} in {cave}")
 
-    # path to downsampled cloud filepath.
-    cloud_fp = path.join(filepath, "pointclouds", f"{cave}_{passage}_sampled_5cm_PCV_normals_classified_georef.las")
-    
-    # load point cloud in memory.
-    cc_cloud = cc.loadPointCloud(cloud_fp)
+    # path to downsampled cloud filepath, in local coordinates if no georeferenced file exists.
+    cloud_fp = find_cloud_filepath(filepath, sampling="5cm")
 
-    # if no georeferenced file exists (cc_cloud of type None), then load one in local coordinates.
-    if cc_cloud is None:
-        # update path to downsampled cloud filepath.
-        cloud_fp = path.join(filepath, "pointclouds", f"{cave}_{passage}_sampled_5cm_PCV_normals_classified.las")
+    if cloud_fp is None:
+        print("no cloud to process here")
+        return None
 
     # load point cloud in memory.               
     cc_cloud = cc.loadPointCloud(cloud_fp)
@@ -145,14 +204,7 @@ def process_centreline(filepath, lbc_args, ct_args) -> dict:
     # run the skeletisation routine
     local_shift, t, nodes, edge_index, branch_index = extract_skeleton(cloud,ct_args, lbc_args)
     
-    edge_branch_index = []
-    for c, branch in enumerate(branch_index):
-        for elem in branch:
-            edge_branch_index.append(c)
-
-    edge_branch_index = np.array(edge_branch_index).flatten()
-    flat_branch_index = np.hstack(branch_index).flatten()
-
+    branches = branches_from_index(branch_index)
 
     fig, ax = plt.subplots(figsize = (10,10))
 
@@ -178,13 +230,13 @@ def process_centreline(filepath, lbc_args, ct_args) -> dict:
 
     # save the data files.
     np.savetxt(nodes_fp, nodes -global_shift, fmt="%.3f")
-    branches = np.vstack((edge_branch_index, flat_branch_index)).T
     np.savetxt(branch_fp, branches, fmt="%.0d")
     edges = edge_index.T
     np.savetxt(edges_fp, edges, fmt="%.0d")
 
 
-    centreline = {"nodes" : nodes,
+    # return the nodes in the same (original) coordinates as the saved files.
+    centreline = {"nodes" : nodes - global_shift,
             "edges" : edges, 
             "branches" : branches}
     
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+File (Python):  'spanning_tree.py'
+author:         Tanguy Racine
+date:           2025
+
+Minimum spanning tree and branch decomposition of thinned centreline points
+using scipy only:
+- k-nearest neighbour graph from a multithreaded KD-tree
+- minimum spanning tree from scipy.sparse.csgraph
+- branch decomposition from node degrees
+"""
+
+import numpy as np
+
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree, connected_components
+from scipy.spatial import cKDTree
+
+
+def get_mst(coords: np.ndarray, k_neighbours: int = 12) -> np.ndarray:
+    """Builds the minimum spanning tree of the k-nearest neighbour graph of a set of points.
+
+    ----------
+
+        arguments:
+
+            coords: a numpy.ndarray object (N x 3 matrix)
+            k_neighbours: the number of nearest neighbours linked to each point
+
+        returns: numpy.ndarray (2 x E matrix) of node indices, one column per edge
+    """
+    n = len(coords)
+    k = min(k_neighbours, n - 1)
+    if k < 1:
+        return np.zeros((2, 0), dtype=np.int64)
+
+    # the first neighbour of each point is the point itself.
+    distances, neighbours = cKDTree(coords).query(coords, k=k + 1, workers=-1)
+    source = np.repeat(np.arange(n), k)
+    target = neighbours[:, 1:].ravel()
+    weights = distances[:, 1:].ravel()
+
+    # csgraph treats zero weights as missing edges, so duplicate points get a tiny weight.
+    weights[weights == 0] = np.finfo(float).tiny
+
+    knn_graph = coo_matrix((weights, (source, target)), shape=(n, n)).tocsr()
+    mst = minimum_spanning_tree(knn_graph).tocoo()
+
+    return np.vstack((mst.row, mst.col)).astype(np.int64)
+
+
+def chain_edges(edges: np.ndarray, labels: np.ndarray, n_nodes: int) -> np.ndarray:
+    """Links the edges of each branch through their shared nodes.
+
+    ----------
+
+        arguments:
+
+            edges: a numpy.ndarray object (E x 2 matrix) of node indices
+            labels: the branch label of every edge
+            n_nodes: the number of nodes
+
+        returns: numpy.ndarray (E x 2 matrix) where [e, s] is the edge of the same branch
+        following e through its end s, or -1 where that end does not join exactly two
+        edges of the branch
+    """
+    n_edges = len(edges)
+
+    # every (branch, node) pair shared by exactly two edges of the branch links them.
+    keys = np.repeat(labels, 2) * n_nodes + edges.ravel()
+    edge_of = np.repeat(np.arange(n_edges), 2)
+    side_of = np.tile([0, 1], n_edges)
+
+    order = np.argsort(keys, kind="stable")
+    edge_of, side_of = edge_of[order], side_of[order]
+    _, first, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    a = first[counts == 2]
+    b = a + 1
+
+    next_edge = np.full((n_edges, 2), -1, dtype=np.int64)
+    next_edge[edge_of[a], side_of[a]] = edge_of[b]
+    next_edge[edge_of[b], side_of[b]] = edge_of[a]
+    return next_edge
+
+
+def walk_branches(edges: np.ndarray,
+                  next_edge: np.ndarray,
+                  start: np.ndarray,
+                  entry_side: np.ndarray,
+                  offsets: np.ndarray,
+                  branches: np.ndarray = None) -> tuple:
+    """Walks all branches simultaneously, one edge per step, from a starting edge
+    entered through a given end, until the branch end or its number of edges is reached.
+
+    ----------
+
+        arguments:
+
+            edges: a numpy.ndarray object (E x 2 matrix) of node indices
+            next_edge: the edge links returned by chain_edges
+            start: the starting edge of every branch
+            entry_side: the end (0 or 1) through which each starting edge is entered
+            offsets: branch b fills the slots offsets[b]:offsets[b+1] of the outputs
+            branches: the branches to walk, matching start, defaults to all of them
+
+        returns:
+            ordered: the edge index of every slot, in walking order
+            oriented: the (start node, end node) of every slot (E x 2 matrix)
+        slots that the walk did not reach are left at -1.
+    """
+    ordered = np.full(len(edges), -1, dtype=np.int64)
+    oriented = np.full((len(edges), 2), -1, dtype=np.int64)
+
+    lengths = np.diff(offsets)
+    current = np.asarray(start, dtype=np.int64)
+    entry_side = np.asarray(entry_side, dtype=np.int64)
+    branch = np.arange(len(lengths)) if branches is None else np.asarray(branches, dtype=np.int64)
+
+    for step in range(lengths[branch].max() if len(branch) else 0):
+        slot = offsets[branch] + step
+        exit_node = edges[current, 1 - entry_side]
+        ordered[slot] = current
+        oriented[slot] = np.column_stack((edges[current, entry_side], exit_node))
+
+        following = next_edge[current, 1 - entry_side]
+        active = (following >= 0) & (step + 1 < lengths[branch])
+        current, branch, exit_node = following[active], branch[active], exit_node[active]
+        entry_side = (edges[current, 1] == exit_node).astype(np.int64)
+
+    return ordered, oriented
+
+
+def get_branch_index(edge_index: np.ndarray, n_nodes: int) -> tuple:
+    """Decomposes a tree (or forest) into branches, i.e. chains of edges joined by nodes
+    of degree two. The edges of each branch are listed in order from one end to the other
+    and are oriented in that direction, so that edge_index[1] of an edge is edge_index[0]
+    of the next edge in its branch.
+
+    ----------
+
+        arguments:
+
+            edge_index: a numpy.ndarray object (2 x E matrix) of node indices
+            n_nodes: the number of nodes
+
+        returns:
+            edge_index: the oriented edge index (2 x E matrix)
+            branch_index: a list of arrays of edge indices, one per branch
+    """
+    edges = edge_index.T.copy()
+    n_edges = len(edges)
+    if n_edges == 0:
+        return edge_index, []
+
+    degree = np.bincount(edges.ravel(), minlength=n_nodes)
+
+    # list the two edges incident to every node of degree two.
+    node_of = edges.ravel()
+    edge_of = np.repeat(np.arange(n_edges), 2)
+    order = np.argsort(node_of, kind="stable")
+    node_of, edge_of = node_of[order], edge_of[order]
+    pairs = edge_of[degree[node_of] == 2].reshape(-1, 2)
+
+    # edges chained through degree-two nodes belong to the same branch.
+    chain_graph = coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n_edges, n_edges))
+    n_branches, labels = connected_components(chain_graph, directed=False)
+    next_edge = chain_edges(edges, labels, n_nodes)
+
+    # in a forest every branch has an end: start each branch from its lowest terminal edge.
+    terminal_edges = np.flatnonzero((next_edge < 0).any(axis=1))
+    _, first = np.unique(labels[terminal_edges], return_index=True)
+    start = terminal_edges[first]
+    entry_side = np.argmax(next_edge[start] < 0, axis=1)
+
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=n_branches))))
+    ordered, oriented_slots = walk_branches(edges, next_edge, start, entry_side, offsets)
+
+    oriented = np.empty_like(edges)
+    oriented[ordered] = oriented_slots
+
+    branch_index = np.split(ordered, offsets[1:-1])
+    return oriented.T, branch_index
+
+
+def get_mst_branches(coords: np.ndarray, k_neighbours: int = 12) -> tuple:
+    """Computes the minimum spanning tree of a set of points and its branches.
+
+    ----------
+
+        arguments:
+
+            coords: a numpy.ndarray object (N x 3 matrix)
+            k_neighbours: the number of nearest neighbours linked to each point
+
+        returns:
+            edge_index: numpy.ndarray (2 x E matrix)
+            branch_index: a list of arrays of edge indices, one per branch
+    """
+    return get_branch_index(get_mst(coords, k_neighbours), len(coords))
@@ -49,8 +49,9 @@ def spatially_downsample(point_cloud: np.ndarray,
 
 def return_largest_component(point_cloud: np.ndarray, 
                              octree_level: int= 8,
-                             min_component_size: int =10
-                             )-> np.ndarray :
+                             min_component_size: int =10,
+                             return_n_components: bool = False
+                             ):
     """A convenience function for finding the largest connected component of an array of spatial coordinates.
     using the dedicated CloudCompare algorithm. 
     
@@ -63,8 +64,10 @@ def return_largest_component(point_cloud: np.ndarray,
             distance between any two components of the array.
             min_component_size: an integer determining the minimum size of clusters kept as
             individual components.
+            return_n_components: a boolean to also return the number of components found.
         
-        returns: numpy.ndarray  (N x 3 matrix) as the largest component of the input array    
+        returns: numpy.ndarray  (N x 3 matrix) as the largest component of the input array,
+        and the number of components if return_n_components is True.
     """
     # instantiate a ccPointCloud() object
     cloud = cc.ccPointCloud()
@@ -82,6 +85,8 @@ def return_largest_component(point_cloud: np.ndarray,
         largest = cloud
 
     # return the coordinates of the cloud 
+    if return_n_components:
+        return largest.toNpArrayCopy(), len(out[1])
     return largest.toNpArrayCopy()
 
 def array_to_o3d(point_cloud: np.ndarray) -> o3d.geometry.PointCloud: